@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration.
+
+Runs the FastAPI app under uvicorn workers. The app is imported once in
+the master (preload_app) and forked, so the compiled agent and model
+clients are shared copy-on-write instead of rebuilt per worker.
+
+Without REDIS_URL, conversation memory lives in each worker process, so
+the default is a single worker; with it, 2 * CPUs + 1. WEB_CONCURRENCY
+overrides either default.
+"""
+
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = "0.0.0.0:5001"
+worker_class = "uvicorn_worker.UvicornWorker"
+_default_workers = (
+    2 * multiprocessing.cpu_count() + 1 if os.getenv("REDIS_URL") else 1
+)
+workers = int(os.getenv("WEB_CONCURRENCY", str(_default_workers)))
+preload_app = True
+timeout = 120
+loglevel = os.getenv("LOG_LEVEL", "warning")
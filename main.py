@@ -6,34 +6,108 @@ chat agent using OpenAI and Tavily search tools. It utilizes
 LangGraph for state management and memory persistence.
 """
 
-from typing import Any, cast
-
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import weakref
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Optional, cast
+
+import httpx
+import orjson
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+)
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
 from langgraph.prebuilt import create_react_agent
 from pydantic import BaseModel, Field
 
+from semantic_cache import SemanticCache
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """
+    Set up event-loop-bound resources on startup and release them on shutdown.
+
+    The model clients, tools and compiled agent are built at import time
+    so that ``gunicorn --preload`` creates them once and shares them with
+    every forked worker. Only resources bound to a worker's event loop
+    are set up here.
+
+    Args:
+        _ (FastAPI): The application instance.
+
+    Yields:
+        None: Control to the running application.
+    """
+    async with AsyncExitStack() as stack:
+        if isinstance(checkpointer, AsyncRedisSaver):
+            # Creates the Redis indexes and closes the connection on exit
+            await stack.enter_async_context(checkpointer)
+        yield
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+        await http_client.aclose()
+
+
 app = FastAPI(
     title="LangChain Chat Agent",
     description="A RAG-enabled chat agent using OpenAI and Tavily",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Initialize Templates
 templates = Jinja2Templates(directory="templates")
 
+# The chat page is static per deployment, so render it once
+INDEX_HTML = templates.get_template("index.html").render().encode()
+INDEX_ETAG = f'"{hashlib.md5(INDEX_HTML).hexdigest()}"'
+INDEX_HEADERS = {"ETag": INDEX_ETAG, "Cache-Control": "public, max-age=300"}
+
+# Shared HTTP/2 connection pool so OpenAI calls reuse TCP+TLS sessions
+http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=30.0,
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+)
+
 # Initialize OpenAI Chat Model
 # ChatOpenAI automatically reads OPENAI_API_KEY from environment variables.
-llm = ChatOpenAI(temperature=0.7)
+# gpt-4o-mini supports automatic prompt caching of repeated prefixes.
+llm = ChatOpenAI(
+    temperature=0.7, model="gpt-4o-mini", http_async_client=http_client
+)
+
+# Fixed system prompt. It must never vary between turns so that the
+# tools + system + history prefix stays byte-identical and cacheable.
+SYSTEM_PROMPT = (
+    "You are a helpful assistant with access to a web search tool. "
+    "Use it for questions about recent events or facts you are unsure of, "
+    "and answer concisely."
+)
 
 # Tools
 tavily_search = TavilySearchResults(
@@ -46,16 +120,146 @@ tavily_search = TavilySearchResults(
 tools: list[BaseTool] = [tavily_search]
 
 # Initialize Memory
-checkpointer = MemorySaver()
+# With REDIS_URL set, conversation state is shared by all worker processes
+# and survives restarts; otherwise it lives in this process only.
+REDIS_URL = os.getenv("REDIS_URL")
+checkpointer: BaseCheckpointSaver[Any] = (
+    AsyncRedisSaver(redis_url=REDIS_URL) if REDIS_URL else MemorySaver()
+)
 
 # Initialize LangGraph Agent with Checkpointer
 # Return type of create_react_agent is CompiledGraph, but importing it
 # can be flaky with stubs. We allow type inference or Any if strict.
 agent_executor: Any = create_react_agent(
-    llm, tools, checkpointer=checkpointer
+    llm, tools, prompt=SYSTEM_PROMPT, checkpointer=checkpointer
+)
+
+# Serialize turns within a thread so its message prefix only ever grows
+# by appending; different threads still run concurrently. Locks are held
+# weakly so idle threads' locks are garbage-collected.
+_thread_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def _lock_for(thread_id: str) -> asyncio.Lock:
+    """
+    Return the lock serializing turns of a conversation thread.
+
+    Args:
+        thread_id (str): The conversation thread ID.
+
+    Returns:
+        asyncio.Lock: The thread's lock, created on first use.
+    """
+    lock = _thread_locks.get(thread_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _thread_locks[thread_id] = lock
+    return lock
+
+
+# Semantic cache for near-duplicate queries within a thread
+semantic_cache = SemanticCache(
+    OpenAIEmbeddings(
+        model="text-embedding-3-small", http_async_client=http_client
+    ),
+    similarity_threshold=0.92,
+    max_entries=1024,
+    ttl_seconds=3600.0,
+)
+
+
+# History compaction: once a thread's messages exceed this many characters,
+# everything before the last few user turns is replaced by a summary. The
+# older part must itself be large enough to be worth summarizing, so long
+# recent turns do not trigger a summary call on every turn.
+HISTORY_CHAR_LIMIT = 8000
+HISTORY_MIN_SUMMARY_CHARS = 2000
+HISTORY_KEEP_TURNS = 2
+SUMMARY_PROMPT = (
+    "Summarize the conversation so far in a few sentences, keeping any "
+    "names, facts and preferences the user shared."
 )
 
 
+async def _compact_history(config: RunnableConfig) -> None:
+    """
+    Summarize old messages of a thread once its history grows too large.
+
+    Keeps the last HISTORY_KEEP_TURNS user turns verbatim so tool calls
+    are never split from their results.
+
+    Args:
+        config (RunnableConfig): The memory config identifying the thread.
+    """
+    state = await agent_executor.aget_state(config)
+    messages: list[BaseMessage] = state.values.get("messages", [])
+    if sum(len(str(m.content)) for m in messages) <= HISTORY_CHAR_LIMIT:
+        return
+
+    turn_starts = [
+        i for i, m in enumerate(messages) if isinstance(m, HumanMessage)
+    ]
+    if len(turn_starts) <= HISTORY_KEEP_TURNS:
+        return
+
+    split = turn_starts[-HISTORY_KEEP_TURNS]
+    old_chars = sum(len(str(m.content)) for m in messages[:split])
+    if old_chars < HISTORY_MIN_SUMMARY_CHARS:
+        return
+
+    summary = await llm.ainvoke(
+        [SystemMessage(SUMMARY_PROMPT), *messages[:split]]
+    )
+    await agent_executor.aupdate_state(
+        config,
+        {
+            "messages": [
+                RemoveMessage(id=REMOVE_ALL_MESSAGES),
+                SystemMessage(
+                    f"Summary of the earlier conversation: {summary.content}"
+                ),
+                *messages[split:],
+            ]
+        },
+    )
+
+
+# Compactions running after their turn's reply was sent
+_background_tasks: set[asyncio.Task[None]] = set()
+
+
+async def _compact_in_background(thread_id: str) -> None:
+    """
+    Compact a thread's history while holding its turn lock.
+
+    Args:
+        thread_id (str): The conversation thread ID.
+    """
+    try:
+        async with _lock_for(thread_id):
+            await _compact_history(
+                cast(
+                    RunnableConfig, {"configurable": {"thread_id": thread_id}}
+                )
+            )
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("History compaction failed", exc_info=True)
+
+
+def _schedule_compaction(thread_id: str) -> None:
+    """
+    Compact a thread's history without delaying the current reply.
+
+    Args:
+        thread_id (str): The conversation thread ID.
+    """
+    task = asyncio.create_task(_compact_in_background(thread_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
 class ChatRequest(BaseModel):
     """
     Request model for the chat endpoint.
@@ -84,8 +288,168 @@ class ChatResponse(BaseModel):
     thread_id: str = Field(..., description="The conversation thread ID.")
 
 
+# Model for the small-talk fast path. It carries the agent's tool
+# definitions (but may not call them) so its prompt prefix matches the
+# agent's and OpenAI's prompt cache is shared between the two paths.
+direct_llm = llm.bind_tools(tools, tool_choice="none")
+
+# Small-talk fast path: greetings, thanks and bare arithmetic are answered
+# by the model directly instead of running the tool-calling agent, unless
+# they also mention something time-sensitive.
+_SIMPLE_RE = re.compile(
+    r"^(?:(?:hi|hello|hey|good (?:morning|afternoon|evening)|thanks|"
+    r"thank you|ok(?:ay)?|bye|goodbye|who are you|what can you do)\b"
+    r"[\s,.!?]*(?:there|everyone|a lot|so much)?[\s,.!?]*"
+    r"|[\d\s+\-*/().%^=?]+)$",
+    re.IGNORECASE,
+)
+_TIME_RE = re.compile(
+    r"\b(?:today|now|latest|recent|current|news|update|"
+    r"happen(?:ed|ing)|score|price|weather|stock)\b",
+    re.IGNORECASE,
+)
+
+
+def _is_small_talk(query: str) -> bool:
+    """
+    Check whether a query can be answered without web search.
+
+    Args:
+        query (str): The stripped user query.
+
+    Returns:
+        bool: True for greetings, thanks and arithmetic.
+    """
+    return bool(_SIMPLE_RE.match(query)) and not _TIME_RE.search(query)
+
+
+async def _reply_directly(query: str, config: RunnableConfig) -> str:
+    """
+    Answer a query with the bare model and record the turn in memory.
+
+    The model sees the same tool definitions, system prompt and history
+    as the agent, so the conversation stays consistent and the cached
+    prompt prefix can be reused.
+
+    Args:
+        query (str): The stripped user query.
+        config (RunnableConfig): The memory config identifying the thread.
+
+    Returns:
+        str: The AI's response.
+    """
+    state = await agent_executor.aget_state(config)
+    human = HumanMessage(query)
+    reply = await direct_llm.ainvoke(
+        [
+            SystemMessage(SYSTEM_PROMPT),
+            *state.values.get("messages", []),
+            human,
+        ]
+    )
+    await _record_turn(config, human, reply)
+    return str(reply.content)
+
+
+async def _record_turn(
+    config: RunnableConfig, human: HumanMessage, reply: BaseMessage
+) -> None:
+    """
+    Append a turn answered outside the agent graph to the thread's memory.
+
+    Args:
+        config (RunnableConfig): The memory config identifying the thread.
+        human (HumanMessage): The user's message.
+        reply (BaseMessage): The AI's response.
+    """
+    await agent_executor.aupdate_state(
+        config, {"messages": [human, reply]}, as_node="agent"
+    )
+
+
+async def _checkpoint_id(config: RunnableConfig) -> Optional[str]:
+    """
+    Return the id of a thread's latest checkpoint.
+
+    Args:
+        config (RunnableConfig): The memory config identifying the thread.
+
+    Returns:
+        Optional[str]: The checkpoint id, or None for a new thread.
+    """
+    state = await agent_executor.aget_state(config)
+    return cast(
+        Optional[str], state.config.get("configurable", {}).get("checkpoint_id")
+    )
+
+
+# In-flight agent runs keyed by (thread_id, query hash)
+_inflight: dict[tuple[str, str], asyncio.Future[str]] = {}
+
+
+async def _run_turn(query: str, thread_id: str) -> str:
+    """
+    Run one conversation turn, from the cache or through the agent.
+
+    A cached answer is only valid while the thread's history is unchanged.
+    Entries are tagged with the thread's checkpoint id, which is shared by
+    all workers when memory lives in Redis, and a hit is only accepted
+    while that id is still current.
+
+    Args:
+        query (str): The stripped user query.
+        thread_id (str): The conversation thread ID.
+
+    Returns:
+        str: The AI's response.
+    """
+    config = cast(RunnableConfig, {"configurable": {"thread_id": thread_id}})
+
+    # Small talk is answered cheaply without the cache, and time-sensitive
+    # questions must not be served stale, so neither is embedded
+    small_talk = _is_small_talk(query)
+    query_vector = (
+        None
+        if small_talk or _TIME_RE.search(query)
+        else await semantic_cache.aembed(query)
+    )
+
+    async with _lock_for(thread_id):
+        # Serve a repeat of the thread's last question from the cache,
+        # still recording the turn so memory matches what the user saw
+        cached = (
+            semantic_cache.get(
+                thread_id, query_vector, await _checkpoint_id(config)
+            )
+            if query_vector is not None
+            else None
+        )
+        if cached is not None:
+            content = cached
+            await _record_turn(config, HumanMessage(query), AIMessage(cached))
+        elif small_talk:
+            content = await _reply_directly(query, config)
+        else:
+            # Invoke agent without blocking the event loop
+            response: dict[str, Any] = await agent_executor.ainvoke(
+                {"messages": [("user", query)]}, config=config
+            )
+            # The agent state contains the full message history.
+            # We want to return the last message (AI response).
+            content = str(response["messages"][-1].content)
+
+        semantic_cache.invalidate(thread_id)
+        if query_vector is not None:
+            semantic_cache.put(
+                thread_id, query_vector, content, await _checkpoint_id(config)
+            )
+
+    _schedule_compaction(thread_id)
+    return content
+
+
 @app.get("/")
-async def health_check(request: Request):
+async def health_check(request: Request) -> Response:
     """
     Serve the chat interface.
 
@@ -93,9 +457,19 @@ async def health_check(request: Request):
         request (Request): The incoming request.
 
     Returns:
-        TemplateResponse: The rendered HTML page.
+        Response: The pre-rendered HTML page, or 304 if the client's
+        cached copy is still current.
     """
-    return templates.TemplateResponse("index.html", {"request": request})
+    # If-None-Match uses weak comparison, so a W/ prefix is ignored
+    candidates = {
+        tag.strip().removeprefix("W/")
+        for tag in request.headers.get("if-none-match", "").split(",")
+    }
+    if "*" in candidates or INDEX_ETAG in candidates:
+        return Response(status_code=304, headers=INDEX_HEADERS)
+    return Response(
+        content=INDEX_HTML, media_type="text/html", headers=INDEX_HEADERS
+    )
 
 
 @app.post("/chat", response_model=ChatResponse)
@@ -119,24 +493,22 @@ async def chat(request: ChatRequest) -> ChatResponse:
         if not query:
             raise HTTPException(status_code=400, detail="No query provided")
 
-        # Run agent with config for memory
-        # Explicit type cast for mypy strictness
-        config = cast(
-            RunnableConfig,
-            {"configurable": {"thread_id": request.thread_id}},
-        )
-
-        # Invoke agent
-        response: dict[str, Any] = agent_executor.invoke(
-            {"messages": [("user", query)]}, config=config
+        # Identical concurrent requests share a single agent run
+        key = (
+            request.thread_id,
+            hashlib.blake2b(query.encode(), digest_size=16).hexdigest(),
         )
+        task = _inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(_run_turn(query, request.thread_id))
+            _inflight[key] = task
+            task.add_done_callback(lambda _: _inflight.pop(key, None))
 
-        # The agent state contains the full message history.
-        # We want to return the last message (AI response).
-        last_message = response["messages"][-1]
+        # Shield so one disconnecting caller does not cancel the shared run
+        content = await asyncio.shield(task)
 
         return ChatResponse(
-            response=str(last_message.content),
+            response=content,
             thread_id=request.thread_id,
         )
 
@@ -146,5 +518,73 @@ async def chat(request: ChatRequest) -> ChatResponse:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
+async def _stream_agent(
+    query: str, thread_id: str
+) -> AsyncIterator[bytes]:
+    """
+    Yield the agent's answer as Server-Sent Events, token by token.
+
+    Args:
+        query (str): The stripped user query.
+        thread_id (str): The conversation thread ID.
+
+    Yields:
+        bytes: SSE ``data:`` frames with a ``delta`` (or ``error``) payload,
+        terminated by ``data: [DONE]``.
+    """
+    config = cast(RunnableConfig, {"configurable": {"thread_id": thread_id}})
+    try:
+        async with _lock_for(thread_id):
+            async for event in agent_executor.astream_events(
+                {"messages": [("user", query)]}, config, version="v2"
+            ):
+                # Only forward tokens of the agent's own answer
+                if (
+                    event["event"] != "on_chat_model_stream"
+                    or event["metadata"].get("langgraph_node") != "agent"
+                ):
+                    continue
+                delta = event["data"]["chunk"].content
+                if delta:
+                    yield b"data: " + orjson.dumps({"delta": delta}) + b"\n\n"
+            semantic_cache.invalidate(thread_id)
+        _schedule_compaction(thread_id)
+    except Exception as e:  # pylint: disable=broad-except
+        yield b"data: " + orjson.dumps({"error": str(e)}) + b"\n\n"
+    yield b"data: [DONE]\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """
+    Stream a chat response from the LangGraph agent as Server-Sent Events.
+
+    Args:
+        request (ChatRequest): The input request containing query and thread_id.
+
+    Returns:
+        StreamingResponse: A ``text/event-stream`` of response deltas.
+
+    Raises:
+        HTTPException: If query is missing.
+    """
+    query = request.query.strip()
+
+    if not query:
+        raise HTTPException(status_code=400, detail="No query provided")
+
+    return StreamingResponse(
+        _stream_agent(query, request.thread_id),
+        media_type="text/event-stream",
+    )
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5001)
+    # Warning level keeps per-request access lines off stdout;
+    # set LOG_LEVEL=info (or debug) when troubleshooting.
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=5001,
+        log_level=os.getenv("LOG_LEVEL", "warning"),
+    )
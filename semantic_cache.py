@@ -0,0 +1,184 @@
+"""
+Semantic Response Cache.
+
+This module provides an in-process cache that returns a previous agent
+response when a new query is semantically close to one already answered
+in the same conversation thread.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    """
+    A single cached response.
+
+    Attributes:
+        thread_id: The conversation thread the response belongs to.
+        vector: The L2-normalized embedding of the query.
+        response: The AI's response to the query.
+        checkpoint_id: The thread's checkpoint right after the response.
+        created_at: Monotonic timestamp of insertion.
+    """
+
+    thread_id: str
+    vector: np.ndarray
+    response: str
+    checkpoint_id: Optional[str]
+    created_at: float
+
+
+class SemanticCache:
+    """
+    Bounded, TTL-aware cache keyed by query embedding similarity.
+
+    Entries are stored in insertion order and evicted oldest-first once
+    ``max_entries`` is reached. Lookups only consider entries from the
+    same ``thread_id`` whose stored ``checkpoint_id`` still matches the
+    thread's current checkpoint, so an entry goes stale as soon as any
+    process appends to the thread's history.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        similarity_threshold: float = 0.92,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            embeddings (Embeddings): Model used to embed incoming queries.
+            similarity_threshold (float): Minimum cosine similarity for a hit.
+            max_entries (int): Maximum number of stored responses.
+            ttl_seconds (float): Lifetime of an entry in seconds.
+        """
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[int, CacheEntry] = OrderedDict()
+        self._next_key = 0
+
+    async def aembed(self, query: str) -> Optional[np.ndarray]:
+        """
+        Embed a query and L2-normalize the result.
+
+        The cache is best-effort: if the embeddings call fails, None is
+        returned and the caller should skip the cache.
+
+        Args:
+            query (str): The stripped user query.
+
+        Returns:
+            Optional[np.ndarray]: The normalized embedding vector, or None.
+        """
+        try:
+            embedding = await self.embeddings.aembed_query(query)
+        except Exception:  # pylint: disable=broad-except
+            logger.warning("Query embedding failed; skipping cache", exc_info=True)
+            return None
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(
+        self,
+        thread_id: str,
+        vector: np.ndarray,
+        checkpoint_id: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Return the closest cached response for a thread, if similar enough.
+
+        Args:
+            thread_id (str): The conversation thread ID.
+            vector (np.ndarray): The normalized query embedding.
+            checkpoint_id (Optional[str]): The thread's current checkpoint;
+                entries stored at any other checkpoint are ignored.
+
+        Returns:
+            Optional[str]: The cached response, or None on a miss.
+        """
+        self._evict_expired()
+        candidates = [
+            entry for entry in self._entries.values()
+            if entry.thread_id == thread_id
+            and entry.checkpoint_id == checkpoint_id
+        ]
+        if not candidates:
+            return None
+
+        matrix = np.stack([entry.vector for entry in candidates])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return candidates[best].response
+
+    def put(
+        self,
+        thread_id: str,
+        vector: np.ndarray,
+        response: str,
+        checkpoint_id: Optional[str] = None,
+    ) -> None:
+        """
+        Store a response, evicting the oldest entry if the cache is full.
+
+        Args:
+            thread_id (str): The conversation thread ID.
+            vector (np.ndarray): The normalized query embedding.
+            response (str): The AI's response to cache.
+            checkpoint_id (Optional[str]): The thread's checkpoint after
+                the turn that produced the response.
+        """
+        self._entries[self._next_key] = CacheEntry(
+            thread_id=thread_id,
+            vector=vector,
+            response=response,
+            checkpoint_id=checkpoint_id,
+            created_at=time.monotonic(),
+        )
+        self._next_key += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, thread_id: str) -> None:
+        """
+        Drop every cached response of a thread.
+
+        Args:
+            thread_id (str): The conversation thread ID.
+        """
+        for key in [
+            key for key, entry in self._entries.items()
+            if entry.thread_id == thread_id
+        ]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """Remove all cached entries."""
+        self._entries.clear()
+
+    def _evict_expired(self) -> None:
+        """Drop entries older than the TTL from the front of the cache."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.created_at >= cutoff:
+                break
+            del self._entries[key]
@@ -1,4 +1,4 @@
-from unittest.mock import patch
+from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 from fastapi.testclient import TestClient
 import os
@@ -7,7 +7,10 @@ import os
 os.environ["TAVILY_API_KEY"] = "test-key"
 os.environ["OPENAI_API_KEY"] = "test-key"
 
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
 from main import app
+from semantic_cache import SemanticCache
 
 @pytest.fixture
 def client():
@@ -19,4 +22,19 @@ def client():
 def mock_agent_executor():
     """Fixture that mocks the agent_executor to prevent actual execution during tests."""
     with patch("main.agent_executor") as mock:
+        mock.ainvoke = AsyncMock()
+        mock.aget_state = AsyncMock(
+            return_value=MagicMock(
+                values={"messages": []},
+                config={"configurable": {"checkpoint_id": "c1"}},
+            )
+        )
+        mock.aupdate_state = AsyncMock()
         yield mock
+
+@pytest.fixture(autouse=True)
+def semantic_cache():
+    """Fixture that swaps in a fresh cache backed by offline fake embeddings."""
+    cache = SemanticCache(DeterministicFakeEmbedding(size=64))
+    with patch("main.semantic_cache", cache):
+        yield cache
@@ -5,8 +5,25 @@ This module contains tests for the chat endpoint, verifying behavior
 for both invalid inputs and successful interactions using mocked agents.
 """
 
-from unittest.mock import MagicMock
+import asyncio
+import gc
+import threading
+import time
+from typing import Any, AsyncIterator, cast
+from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi.testclient import TestClient
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+)
+from langchain_core.runnables import RunnableConfig
+
+import main
+from main import ChatRequest, ChatResponse, chat
+from semantic_cache import SemanticCache
 
 
 def test_chat_no_query(client: TestClient) -> None:
@@ -44,22 +61,454 @@ def test_chat_success(
     """
     # Setup mock return value
     mock_response = {"messages": [MagicMock(content="Hello there!")]}
-    mock_agent_executor.invoke.return_value = mock_response
+    mock_agent_executor.ainvoke.return_value = mock_response
 
-    response = client.post("/chat", json={"query": "Hello"})
+    response = client.post("/chat", json={"query": "What is LangGraph?"})
 
     assert response.status_code == 200
     data = response.json()
     assert data["response"] == "Hello there!"
     assert data["thread_id"] == "default_thread"  # Default thread_id check
 
-    # Verify invoke was called correctly
-    mock_agent_executor.invoke.assert_called_once()
+    # Verify ainvoke was called correctly
+    mock_agent_executor.ainvoke.assert_awaited_once()
     # Pylint generally dislikes unpacking call_args directly or assumes
     # it might be None, but strictly speaking for MagicMock it is generally
     # fine in tests. However, to be extra safe and explicitly clear:
-    args, kwargs = mock_agent_executor.invoke.call_args
-    assert args[0] == {"messages": [("user", "Hello")]}
+    args, kwargs = mock_agent_executor.ainvoke.call_args
+    assert args[0] == {"messages": [("user", "What is LangGraph?")]}
     assert kwargs["config"] == {
         "configurable": {"thread_id": "default_thread"}
     }
+
+
+def test_chat_semantic_cache_hit(
+    client: TestClient, mock_agent_executor: MagicMock
+) -> None:
+    """
+    Test that a repeated query in the same thread is served from the cache.
+
+    Args:
+        client (TestClient): The test client for the FastAPI app.
+        mock_agent_executor (MagicMock): The mocked agent executor.
+
+    Asserts:
+        Both responses match and the agent is awaited only once.
+        A different thread does not reuse the cached response.
+    """
+    mock_response = {"messages": [MagicMock(content="Paris")]}
+    mock_agent_executor.ainvoke.return_value = mock_response
+
+    first = client.post("/chat", json={"query": "Capital of France?"})
+    second = client.post("/chat", json={"query": "  Capital of France?  "})
+
+    assert first.json()["response"] == "Paris"
+    assert second.json()["response"] == "Paris"
+    mock_agent_executor.ainvoke.assert_awaited_once()
+
+    client.post(
+        "/chat", json={"query": "Capital of France?", "thread_id": "other"}
+    )
+    assert mock_agent_executor.ainvoke.await_count == 2
+
+
+def test_chat_cache_invalidated_by_new_turn(
+    client: TestClient, mock_agent_executor: MagicMock
+) -> None:
+    """
+    Test that a cached answer is not reused once the thread has moved on.
+
+    Args:
+        client (TestClient): The test client for the FastAPI app.
+        mock_agent_executor (MagicMock): The mocked agent executor.
+
+    Asserts:
+        Re-asking after a new turn runs the agent again, and a cache hit
+        is still recorded in the thread's memory.
+    """
+    mock_agent_executor.ainvoke.side_effect = [
+        {"messages": [AIMessage("I don't know your name.")]},
+        {"messages": [AIMessage("Nice to meet you, Bob.")]},
+        {"messages": [AIMessage("Your name is Bob.")]},
+    ]
+    ask = {"query": "What is my name?", "thread_id": "s1"}
+
+    assert client.post("/chat", json=ask).json()["response"] == (
+        "I don't know your name."
+    )
+    client.post("/chat", json={"query": "My name is Bob", "thread_id": "s1"})
+    assert client.post("/chat", json=ask).json()["response"] == (
+        "Your name is Bob."
+    )
+
+    # An immediate repeat is a cache hit, written to memory as a turn
+    assert client.post("/chat", json=ask).json()["response"] == (
+        "Your name is Bob."
+    )
+    assert mock_agent_executor.ainvoke.await_count == 3
+    recorded = mock_agent_executor.aupdate_state.call_args.args[1]["messages"]
+    assert [m.content for m in recorded] == [
+        "What is my name?", "Your name is Bob."
+    ]
+
+
+def test_chat_cache_rejects_turns_from_other_workers(
+    client: TestClient, mock_agent_executor: MagicMock
+) -> None:
+    """
+    Test that a cached answer is dropped once the shared checkpoint moves.
+
+    Another worker appending to the thread leaves this process's cache
+    untouched but advances the thread's checkpoint id.
+
+    Args:
+        client (TestClient): The test client for the FastAPI app.
+        mock_agent_executor (MagicMock): The mocked agent executor.
+
+    Asserts:
+        The repeated question runs the agent again.
+    """
+    mock_agent_executor.ainvoke.side_effect = [
+        {"messages": [AIMessage("I don't know your name.")]},
+        {"messages": [AIMessage("Your name is Bob.")]},
+    ]
+    ask = {"query": "What is my name?", "thread_id": "s1"}
+    client.post("/chat", json=ask)
+
+    # "My name is Bob" was handled by another worker
+    mock_agent_executor.aget_state.return_value = MagicMock(
+        values={"messages": []},
+        config={"configurable": {"checkpoint_id": "c2"}},
+    )
+
+    assert client.post("/chat", json=ask).json()["response"] == (
+        "Your name is Bob."
+    )
+    assert mock_agent_executor.ainvoke.await_count == 2
+
+
+def test_chat_time_sensitive_query_bypasses_cache(
+    client: TestClient, mock_agent_executor: MagicMock
+) -> None:
+    """
+    Test that time-sensitive questions are never served from the cache.
+
+    Args:
+        client (TestClient): The test client for the FastAPI app.
+        mock_agent_executor (MagicMock): The mocked agent executor.
+
+    Asserts:
+        Asking the same time-sensitive question twice runs the agent twice.
+    """
+    mock_agent_executor.ainvoke.return_value = {"messages": [AIMessage("2-1")]}
+
+    client.post("/chat", json={"query": "What is the score now?"})
+    client.post("/chat", json={"query": "What is the score now?"})
+
+    assert mock_agent_executor.ainvoke.await_count == 2
+
+
+def test_chat_embedding_outage_falls_through(
+    client: TestClient,
+    mock_agent_executor: MagicMock,
+    semantic_cache: SemanticCache,
+) -> None:
+    """
+    Test that an embeddings failure does not fail the request.
+
+    Args:
+        client (TestClient): The test client for the FastAPI app.
+        mock_agent_executor (MagicMock): The mocked agent executor.
+        semantic_cache (SemanticCache): The patched semantic cache.
+
+    Asserts:
+        The agent still answers with status 200.
+    """
+    semantic_cache.embeddings = MagicMock(
+        aembed_query=AsyncMock(side_effect=RuntimeError("rate limited"))
+    )
+    mock_agent_executor.ainvoke.return_value = {"messages": [AIMessage("Answer")]}
+
+    response = client.post("/chat", json={"query": "What is LangGraph?"})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == "Answer"
+
+
+def test_chat_compacts_long_history(
+    client: TestClient, mock_agent_executor: MagicMock
+) -> None:
+    """
+    Test that an oversized thread history is replaced by a summary.
+
+    Args:
+        client (TestClient): The test client for the FastAPI app.
+        mock_agent_executor (MagicMock): The mocked agent executor.
+
+    Asserts:
+        The reply is sent before the summary call finishes.
+        The summary model is called with the old turns only.
+        The state is rewritten as summary + the most recent turns.
+    """
+    history = [
+        HumanMessage("a" * 5000),
+        AIMessage("b" * 5000),
+        HumanMessage("second"),
+        AIMessage("reply"),
+        HumanMessage("Hello"),
+        AIMessage("Hello there!"),
+    ]
+    mock_agent_executor.ainvoke.return_value = {"messages": history}
+    mock_agent_executor.aget_state.return_value = MagicMock(
+        values={"messages": history}
+    )
+
+    release = threading.Event()
+
+    async def slow_summary(*_: Any) -> AIMessage:
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return AIMessage("User said a.")
+
+    with patch("main.llm") as mock_llm:
+        mock_llm.ainvoke = AsyncMock(side_effect=slow_summary)
+        response = client.post("/chat", json={"query": "What is LangGraph?"})
+
+        assert response.status_code == 200
+        mock_agent_executor.aupdate_state.assert_not_called()
+
+        release.set()
+        deadline = time.monotonic() + 2
+        while (
+            not mock_agent_executor.aupdate_state.called
+            and time.monotonic() < deadline
+        ):
+            time.sleep(0.01)
+
+    summary_input = mock_llm.ainvoke.call_args.args[0]
+    assert summary_input[1:] == history[:2]
+
+    update = mock_agent_executor.aupdate_state.call_args.args[1]["messages"]
+    assert isinstance(update[0], RemoveMessage)
+    assert "User said a." in update[1].content
+    assert update[2:] == history[2:]
+
+
+def test_compact_history_skips_small_old_part(
+    mock_agent_executor: MagicMock,
+) -> None:
+    """
+    Test that large recent turns alone do not trigger a summary.
+
+    Args:
+        mock_agent_executor (MagicMock): The mocked agent executor.
+
+    Asserts:
+        Neither the summary model nor the state update is called.
+    """
+    history = [
+        SystemMessage("Summary of the earlier conversation: hi."),
+        HumanMessage("first"),
+        AIMessage("short"),
+        HumanMessage("second"),
+        AIMessage("b" * 5000),
+        HumanMessage("third"),
+        AIMessage("c" * 5000),
+    ]
+    mock_agent_executor.aget_state.return_value = MagicMock(
+        values={"messages": history}
+    )
+    config = cast(RunnableConfig, {"configurable": {"thread_id": "t1"}})
+
+    with patch("main.llm") as mock_llm:
+        mock_llm.ainvoke = AsyncMock()
+        asyncio.run(main._compact_history(config))  # pylint: disable=protected-access
+
+    mock_llm.ainvoke.assert_not_awaited()
+    mock_agent_executor.aupdate_state.assert_not_awaited()
+
+
+def test_chat_stream(
+    client: TestClient, mock_agent_executor: MagicMock
+) -> None:
+    """
+    Test the /chat/stream endpoint relays agent tokens as SSE frames.
+
+    Args:
+        client (TestClient): The test client for the FastAPI app.
+        mock_agent_executor (MagicMock): The mocked agent executor.
+
+    Asserts:
+        Only the agent node's non-empty tokens are streamed.
+        The stream is terminated with a [DONE] frame.
+    """
+
+    async def events(*_: Any, **__: Any) -> AsyncIterator[dict[str, Any]]:
+        for node, text in [("agent", "Hel"), ("tools", "x"), ("agent", "lo")]:
+            yield {
+                "event": "on_chat_model_stream",
+                "metadata": {"langgraph_node": node},
+                "data": {"chunk": AIMessageChunk(content=text)},
+            }
+
+    mock_agent_executor.astream_events = events
+
+    response = client.post("/chat/stream", json={"query": "Hi"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == (
+        'data: {"delta":"Hel"}\n\n'
+        'data: {"delta":"lo"}\n\n'
+        "data: [DONE]\n\n"
+    )
+
+
+def test_chat_stream_no_query(client: TestClient) -> None:
+    """
+    Test the /chat/stream endpoint with missing query.
+
+    Args:
+        client (TestClient): The test client for the FastAPI app.
+
+    Asserts:
+        Response status code is 400.
+    """
+    response = client.post("/chat/stream", json={"query": "  "})
+    assert response.status_code == 400
+
+
+def test_chat_coalesces_identical_inflight_requests(
+    mock_agent_executor: MagicMock, semantic_cache: SemanticCache
+) -> None:
+    """
+    Test that identical concurrent requests share one agent run.
+
+    Args:
+        mock_agent_executor (MagicMock): The mocked agent executor.
+        semantic_cache (SemanticCache): The patched semantic cache.
+
+    Asserts:
+        Both callers get the answer; the query is embedded once and the
+        agent runs once.
+    """
+
+    async def slow_invoke(*_: Any, **__: Any) -> dict[str, Any]:
+        await asyncio.sleep(0.05)
+        return {"messages": [AIMessage("Paris")]}
+
+    mock_agent_executor.ainvoke.side_effect = slow_invoke
+    embed = AsyncMock(wraps=semantic_cache.embeddings.aembed_query)
+    semantic_cache.embeddings = MagicMock(aembed_query=embed)
+
+    async def scenario() -> list[ChatResponse]:
+        request = ChatRequest(query="Capital of France?", thread_id="t1")
+        return list(await asyncio.gather(chat(request), chat(request)))
+
+    responses = asyncio.run(scenario())
+
+    assert [r.response for r in responses] == ["Paris", "Paris"]
+    embed.assert_awaited_once()
+    mock_agent_executor.ainvoke.assert_awaited_once()
+
+
+def test_index_etag(client: TestClient) -> None:
+    """
+    Test the / endpoint serves the cached page and honours If-None-Match.
+
+    Args:
+        client (TestClient): The test client for the FastAPI app.
+
+    Asserts:
+        The first response is 200 HTML with ETag and Cache-Control.
+        A conditional request with that ETag returns 304 with no body,
+        also inside a list or as a weak validator.
+    """
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert response.headers["cache-control"] == "public, max-age=300"
+
+    etag = response.headers["etag"]
+    cached = client.get("/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    for header in [f'"other",{etag}', f'W/{etag}', f' "other" , W/{etag} ']:
+        assert client.get("/", headers={"If-None-Match": header}).status_code == 304
+    assert client.get("/", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_thread_locks_are_shared_and_released() -> None:
+    """
+    Test the per-thread lock registry.
+
+    Asserts:
+        The same thread gets the same lock while it is referenced,
+        different threads get different locks, and idle locks are dropped.
+    """
+    # pylint: disable=protected-access
+    lock = main._lock_for("t1")
+    assert main._lock_for("t1") is lock
+    assert main._lock_for("t2") is not lock
+
+    del lock
+    gc.collect()
+    assert "t1" not in main._thread_locks
+
+
+def test_chat_small_talk_skips_agent(
+    client: TestClient,
+    mock_agent_executor: MagicMock,
+    semantic_cache: SemanticCache,
+) -> None:
+    """
+    Test that a greeting is answered by the model without the agent.
+
+    Args:
+        client (TestClient): The test client for the FastAPI app.
+        mock_agent_executor (MagicMock): The mocked agent executor.
+        semantic_cache (SemanticCache): The patched semantic cache.
+
+    Asserts:
+        The agent graph is not run, the query is not embedded, and the
+        turn is written to memory.
+    """
+    embed = AsyncMock()
+    semantic_cache.embeddings = MagicMock(aembed_query=embed)
+
+    with patch("main.direct_llm") as mock_llm:
+        mock_llm.ainvoke = AsyncMock(return_value=AIMessage("Hi!"))
+        response = client.post("/chat", json={"query": "Hello there!"})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == "Hi!"
+    mock_agent_executor.ainvoke.assert_not_awaited()
+    embed.assert_not_awaited()
+
+    args, kwargs = mock_agent_executor.aupdate_state.call_args
+    assert [m.content for m in args[1]["messages"]] == ["Hello there!", "Hi!"]
+    assert kwargs["as_node"] == "agent"
+
+
+def test_is_small_talk() -> None:
+    """
+    Test the small-talk classifier.
+
+    Asserts:
+        Greetings and arithmetic match; factual or time-sensitive
+        questions do not.
+    """
+    is_small_talk = main._is_small_talk  # pylint: disable=protected-access
+
+    assert is_small_talk("hi")
+    assert is_small_talk("Thanks a lot!")
+    assert is_small_talk("Hello there!")
+    assert is_small_talk("who are you?")
+    assert is_small_talk("12 * (3 + 4)")
+    assert not is_small_talk("hi, any news today?")
+    assert not is_small_talk("Who won the match?")
+    assert not is_small_talk("hello, who won the world cup")
+    assert not is_small_talk("thanks, and who won yesterday?")
+    assert not is_small_talk("ok so who is the CEO of OpenAI?")
+    assert not is_small_talk("Hey what's the Bitcoin value?")
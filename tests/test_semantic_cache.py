@@ -0,0 +1,104 @@
+"""
+Unit tests for the semantic response cache.
+
+This module verifies similarity lookup, thread isolation, size bounds,
+and TTL expiry of SemanticCache.
+"""
+
+import asyncio
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from semantic_cache import SemanticCache
+
+
+def _cache(**kwargs: Any) -> SemanticCache:
+    """Build a cache backed by offline fake embeddings."""
+    return SemanticCache(DeterministicFakeEmbedding(size=64), **kwargs)
+
+
+def _embed(cache: SemanticCache, query: str) -> np.ndarray:
+    """Embed a query, failing the test if embedding did not succeed."""
+    vector = asyncio.run(cache.aembed(query))
+    assert vector is not None
+    return vector
+
+
+def test_aembed_normalizes() -> None:
+    """Embeddings are returned with unit L2 norm."""
+    vector = _embed(_cache(), "hello")
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+
+
+def test_get_hit_and_thread_isolation() -> None:
+    """A stored response is returned only for its own thread."""
+    cache = _cache()
+    vector = _embed(cache, "hello")
+    cache.put("t1", vector, "Hi!")
+
+    assert cache.get("t1", vector) == "Hi!"
+    assert cache.get("t2", vector) is None
+
+
+def test_get_miss_below_threshold() -> None:
+    """Dissimilar queries do not hit the cache."""
+    cache = _cache()
+    cache.put("t1", _embed(cache, "hello"), "Hi!")
+
+    other = _embed(cache, "what is the weather in Lisbon")
+    assert cache.get("t1", other) is None
+
+
+def test_put_evicts_oldest() -> None:
+    """The oldest entry is dropped once max_entries is exceeded."""
+    cache = _cache(max_entries=1)
+    first = _embed(cache, "first")
+    second = _embed(cache, "second")
+    cache.put("t1", first, "one")
+    cache.put("t1", second, "two")
+
+    assert cache.get("t1", first) is None
+    assert cache.get("t1", second) == "two"
+
+
+def test_get_expired_entry() -> None:
+    """Entries older than the TTL are not returned."""
+    cache = _cache(ttl_seconds=-1.0)
+    vector = _embed(cache, "hello")
+    cache.put("t1", vector, "Hi!")
+
+    assert cache.get("t1", vector) is None
+
+
+def test_aembed_failure_skips_cache() -> None:
+    """An embeddings error yields None instead of raising."""
+    embeddings = MagicMock()
+    embeddings.aembed_query = AsyncMock(side_effect=RuntimeError("429"))
+
+    assert asyncio.run(SemanticCache(embeddings).aembed("hello")) is None
+
+
+def test_invalidate_drops_only_that_thread() -> None:
+    """Invalidating a thread leaves other threads' entries intact."""
+    cache = _cache()
+    vector = _embed(cache, "hello")
+    cache.put("t1", vector, "Hi!")
+    cache.put("t2", vector, "Hey!")
+
+    cache.invalidate("t1")
+
+    assert cache.get("t1", vector) is None
+    assert cache.get("t2", vector) == "Hey!"
+
+
+def test_get_rejects_other_checkpoint() -> None:
+    """An entry stored at one checkpoint misses once the thread moved on."""
+    cache = _cache()
+    vector = _embed(cache, "hello")
+    cache.put("t1", vector, "Hi!", "c1")
+
+    assert cache.get("t1", vector, "c1") == "Hi!"
+    assert cache.get("t1", vector, "c2") is None